@@ -1,18 +1,29 @@
 import os
 import asyncio
 import aiohttp
+from aiohttp import web
+import orjson
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
+from telegram.helpers import escape_markdown
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-import pymongo
-from pymongo import MongoClient
-import gridfs
-import io
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import WriteConcern, UpdateOne
+from pymongo.errors import OperationFailure
 import time
-from urllib.parse import quote
+import tempfile
+import re
+import zstandard
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from collections import OrderedDict
 import logging
 from bson import ObjectId
-import threading
-from datetime import datetime
+from datetime import datetime, timedelta
+
+try:
+    import uvloop
+except ImportError:  # Not available on Windows; the default loop works everywhere
+    uvloop = None
 
 # Configure logging
 logging.basicConfig(
@@ -26,26 +37,101 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 TERABOX_API = "https://terabox-fzslcxeeh-nybotxs-projects.vercel.app/"
 PORT = int(os.getenv('PORT', 8080))  # Koyeb port
+# Bot API server uploads go to; a self-hosted one (telegram-bot-api --local) takes far larger files
+TELEGRAM_API = os.getenv('TELEGRAM_API', 'https://api.telegram.org').rstrip('/')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'https://shaky-bonnie-nybotz-4e34dced.koyeb.app/')  # Optional webhook URL
+USE_GRIDFS = os.getenv('USE_GRIDFS', 'false').lower() == 'true'  # Stage files in GridFS before upload
+DOWNLOAD_DIR = os.getenv('DOWNLOAD_DIR') or None  # Temp file location, e.g. /dev/shm for tmpfs; system default if unset
+PIPELINE_DEPTH = 8  # Chunks buffered between a download and its concurrent Telegram upload
+PIPELINE_CHUNK_MIN = 256 * 1024  # Smallest block handed to an idle upload
+PIPELINE_CHUNK_MAX = 4 * 1024 * 1024  # Largest block built up while the upload is busy
+# sendDocument accepts 50 MB on the public Bot API and 2000 MB on a local server
+LOCAL_BOT_API = TELEGRAM_API != 'https://api.telegram.org'
+UPLOAD_LIMIT_LABEL = "2000 MB" if LOCAL_BOT_API else "50 MB"
+MAX_FILE_SIZE = (2000 if LOCAL_BOT_API else 50) * 1000 * 1000  # Bigger files are rejected before downloading
+RANGED_MIN_SIZE = 32 * 1024 * 1024  # Files at least this big are fetched with parallel Range requests
+RANGE_PARTS = 4  # Parallel connections per ranged download
+WRITE_BUFFER_SIZE = 1024 * 1024  # Socket reads are batched up to this before each disk write
+MEMORY_RANGED_MAX = 50 * 1000 * 1000  # Ranged downloads up to the Bot API upload cap (50 MB) are assembled in RAM
+STORAGE_LABEL = "MongoDB GridFS" if USE_GRIDFS else "Direct stream"
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv('MAX_CONCURRENT_DOWNLOADS', '4'))  # Further downloads wait their turn
+API_RETRIES = 3  # Attempts for the Terabox API on transient failures
+DOWNLOAD_RETENTION = 3600  # Seconds finished downloads and staged files are kept
+CLEANUP_DELAY = 5  # Seconds a finished upload waits so deletions can be batched
+CLEANUP_BATCH_SIZE = 1000  # Downloads reaped per cleanup round trip
+SNIFF_SIZE = 4096  # Bytes inspected before choosing a GridFS codec
+GRIDFS_CHUNK_SIZE = 4 * 1024 * 1024  # Bytes per GridFS chunk document (driver default is 255 KiB)
+PROGRESS_EDIT_INTERVAL = 1.0  # Minimum seconds between progress edits (Telegram allows ~1/s per message)
+INFO_CACHE_TTL = 300  # Seconds a resolved share link is reused
+INFO_CACHE_SIZE = 256  # Most resolved share links kept in memory
+FILE_ID_CACHE_SIZE = 4096  # Most delivered files whose Telegram file_id is kept for resending
+STATS_CACHE_TTL = 30  # Seconds /stats and /status reuse their MongoDB results
+
+# Supported Terabox domains, matched against the link's host (subdomains allowed)
+TERABOX_DOMAINS = frozenset({'terabox.com', '1024terabox.com', 'teraboxapp.com'})
 
 # Validate required environment variables
 if not BOT_TOKEN:
     logger.error("BOT_TOKEN environment variable is required!")
     exit(1)
 
-# MongoDB setup with GridFS
-try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-    # Test connection
-    client.admin.command('ping')
-    db = client.terabox_bot
-    fs = gridfs.GridFS(db)
-    downloads_collection = db.downloads
-    users_collection = db.users
-    logger.info("MongoDB connection established successfully")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {e}")
-    exit(1)
+# MongoDB setup with GridFS (async driver, connection is verified in post_init)
+client = AsyncIOMotorClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+db = client.terabox_bot
+# Larger chunks mean far fewer chunk inserts and reads per file
+fs = AsyncIOMotorGridFSBucket(db, chunk_size_bytes=GRIDFS_CHUNK_SIZE)
+# Download docs are ephemeral status records, so skip journaling and majority acks for them
+downloads_collection = db.get_collection('downloads', write_concern=WriteConcern(w=1, j=False))
+users_collection = db.users
+
+async def check_mongodb():
+    """Verify the MongoDB connection before serving updates"""
+    try:
+        await client.admin.command('ping')
+        logger.info("MongoDB connection established successfully")
+    except Exception as e:
+        logger.error("Failed to connect to MongoDB: %s", e)
+        raise
+
+async def migrate_download_history():
+    """Fold completed downloads from before the per-user tally into it, and give them TTL-able dates
+    
+    Those docs carry a float completed_at, which the TTL index ignores; converting it is what marks a doc
+    as migrated, so later startups find nothing left to do.
+    """
+    legacy = {"status": "completed", "completed_at": {"$type": "number"}}
+    tallies = await downloads_collection.aggregate([
+        {"$match": legacy},
+        {"$group": {"_id": "$user_id", "n": {"$sum": 1}}}
+    ]).to_list(length=None)
+    if not tallies:
+        return
+    
+    await users_collection.bulk_write(
+        [UpdateOne({"user_id": t['_id']}, {"$inc": {"completed_downloads": t['n']}}, upsert=True) for t in tallies],
+        ordered=False
+    )
+    # Seconds since the epoch -> BSON date, so the TTL index expires these like any other finished download
+    await downloads_collection.update_many(
+        legacy,
+        [{"$set": {"completed_at": {"$toDate": {"$multiply": ["$completed_at", 1000]}}}}]
+    )
+    logger.info("Migrated completed downloads of %d users to the per-user tally", len(tallies))
+
+async def ensure_indexes():
+    """Create the TTL index that expires finished downloads and the lookup indexes, then migrate old history"""
+    await downloads_collection.create_index("completed_at", expireAfterSeconds=DOWNLOAD_RETENTION)
+    await downloads_collection.create_index([("status", 1)])
+    # Every user read and write filters on user_id; unique also keeps concurrent upserts from duplicating
+    try:
+        await users_collection.create_index([("user_id", 1)], unique=True)
+    except OperationFailure as e:
+        # Older deployments may already hold duplicate user docs; still index the lookups rather than fail startup
+        logger.warning("Unique user_id index not created, falling back to a plain index: %s", e)
+        await users_collection.create_index([("user_id", 1)])
+    # The keep-alive reaper filters on uploadDate alone, which GridFS's (filename, uploadDate) index can't serve
+    await db.fs.files.create_index([("uploadDate", 1)])
+    await migrate_download_history()
 
 class TeraboxBot:
     def __init__(self):
@@ -53,14 +139,32 @@ class TeraboxBot:
         self.keep_alive_task = None
         self.last_activity = time.time()
         self.start_time = time.time()
+        self._stats_cache = (0.0, None)
+        self._ping_cache = (0.0, None)
+        self._cleanup_queue = asyncio.Queue()  # (gridfs file_id, download_id) awaiting deletion
+        self.cleanup_task = None
+        self._info_cache = OrderedDict()  # normalized link -> (fetched_at, API response)
+        self._file_id_cache = OrderedDict()  # normalized link -> Telegram file_id
+        self.inflight = {}  # normalized link -> Future of the Telegram file_id being produced
+        self.download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        self.health_runner = None
+        self._last_edit = {}  # chat_id -> monotonic time before which no progress edit is sent
         
     async def start_session(self):
-        if not self.session:
-            connector = aiohttp.TCPConnector(limit=100, limit_per_host=30)
-            timeout = aiohttp.ClientTimeout(total=300, connect=30)
+        """Create the shared HTTP session (reopened if something closed it)"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=0,  # No global cap; per-host limit keeps bursts polite
+                limit_per_host=20,
+                ttl_dns_cache=600,
+                enable_cleanup_closed=True,
+                keepalive_timeout=75
+            )
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=60)
             self.session = aiohttp.ClientSession(
                 connector=connector,
-                timeout=timeout
+                timeout=timeout,
+                read_bufsize=4 * 1024 * 1024  # Let the transport hand over large buffers
             )
     
     async def close_session(self):
@@ -76,125 +180,622 @@ class TeraboxBot:
                 self.last_activity = time.time()
                 
                 # Ping MongoDB to keep connection alive
-                client.admin.command('ping')
+                await client.admin.command('ping')
                 
                 # Log activity
-                logger.info(f"Keep-alive ping at {datetime.now()}")
+                logger.info("Keep-alive ping at %s", datetime.now())
                 
-                # Clean up old downloads (older than 1 hour)
-                cutoff_time = time.time() - 3600  # 1 hour ago
-                old_downloads = downloads_collection.find({
-                    "status": "completed",
-                    "completed_at": {"$lt": cutoff_time},
-                    "cleanup_completed": {"$ne": True}
-                })
+                # Completed downloads expire via the TTL index; only orphaned GridFS files need reaping
+                cutoff = datetime.utcnow() - timedelta(seconds=DOWNLOAD_RETENTION)
+                old_files = db.fs.files.find(
+                    {"uploadDate": {"$lt": cutoff}},
+                    projection={"_id": 1}
+                ).batch_size(500)
+                file_ids = [f['_id'] async for f in old_files]
                 
+                # Delete files in batches instead of one round trip each
                 cleanup_count = 0
-                for download in old_downloads:
-                    if download.get('gridfs_file_id'):
-                        try:
-                            self.delete_file_from_mongodb(download['gridfs_file_id'])
-                            downloads_collection.update_one(
-                                {"_id": download['_id']},
-                                {"$set": {"cleanup_completed": True}}
-                            )
-                            cleanup_count += 1
-                        except Exception as e:
-                            logger.error(f"Cleanup error for {download['_id']}: {e}")
+                for i in range(0, len(file_ids), CLEANUP_BATCH_SIZE):
+                    batch = file_ids[i:i + CLEANUP_BATCH_SIZE]
+                    try:
+                        await self.delete_files_from_mongodb(batch)
+                        cleanup_count += len(batch)
+                    except Exception as e:
+                        logger.error("Cleanup error for batch of %s files: %s", len(batch), e)
                 
                 if cleanup_count > 0:
-                    logger.info(f"Cleaned up {cleanup_count} old files")
+                    logger.info("Cleaned up %s old files", cleanup_count)
                 
                 await asyncio.sleep(300)  # Keep alive every 5 minutes
                 
             except Exception as e:
-                logger.error(f"Keep-alive error: {e}")
+                logger.error("Keep-alive error: %s", e)
                 await asyncio.sleep(60)  # Retry after 1 minute on error
 
+    async def progress_editor(self, query, queue):
+        """Apply the newest queued progress text to the message, at most once per PROGRESS_EDIT_INTERVAL per chat"""
+        chat_id = query.message.chat_id
+        try:
+            while True:
+                progress_text = await queue.get()
+                
+                # Downloads in the same chat share Telegram's edit budget: claim the next free slot
+                # before sleeping, so concurrent editors line up behind each other instead of waking together
+                now = time.monotonic()
+                slot = max(self._last_edit.get(chat_id, now), now)
+                self._last_edit[chat_id] = slot + PROGRESS_EDIT_INTERVAL
+                if slot > now:
+                    await asyncio.sleep(slot - now)
+                    if not queue.empty():
+                        progress_text = queue.get_nowait()
+                
+                try:
+                    await query.edit_message_text(progress_text, parse_mode='Markdown')
+                except RetryAfter as e:
+                    # Flood control: hold off as long as Telegram asks instead of collecting more 429s
+                    self._last_edit[chat_id] = max(self._last_edit[chat_id], time.monotonic() + e.retry_after)
+                except Exception:
+                    pass  # A dropped progress edit is harmless; cancellation must still get through
+        finally:
+            # Forget chats whose deadline has passed so the table only holds recently edited chats
+            now = time.monotonic()
+            for stale in [chat for chat, deadline in self._last_edit.items() if deadline <= now]:
+                del self._last_edit[stale]
+
+    async def get_bot_stats(self):
+        """Return (total, pending, gridfs_files, gridfs_size_mb), cached for STATS_CACHE_TTL seconds"""
+        cached_at, stats = self._stats_cache
+        if stats is not None and time.time() - cached_at < STATS_CACHE_TTL:
+            return stats
+        
+        # Completed downloads are tallied on user docs (download docs expire); pending ones are live
+        totals = await users_collection.aggregate([
+            {"$group": {"_id": None, "n": {"$sum": "$completed_downloads"}}}
+        ]).to_list(length=None)
+        total_downloads = totals[0]['n'] if totals else 0
+        pending_downloads = await downloads_collection.count_documents(
+            {"status": {"$in": ["pending", "downloading"]}}
+        )
+        
+        # Get GridFS stats (summed server-side)
+        try:
+            agg = await db.fs.files.aggregate([
+                {"$group": {"_id": None, "total": {"$sum": "$length"}, "count": {"$sum": 1}}}
+            ]).to_list(length=None)
+            gridfs_files = agg[0]['count'] if agg else 0
+            gridfs_size_mb = (agg[0]['total'] if agg else 0) / (1024 * 1024)
+        except:
+            gridfs_files = 0
+            gridfs_size_mb = 0
+        
+        stats = (total_downloads, pending_downloads, gridfs_files, gridfs_size_mb)
+        self._stats_cache = (time.time(), stats)
+        return stats
+
+    async def mongodb_is_up(self):
+        """Ping MongoDB, reusing the result for STATS_CACHE_TTL seconds"""
+        cached_at, is_up = self._ping_cache
+        if is_up is not None and time.time() - cached_at < STATS_CACHE_TTL:
+            return is_up
+        
+        try:
+            await client.admin.command('ping')
+            is_up = True
+        except:
+            is_up = False
+        
+        self._ping_cache = (time.time(), is_up)
+        return is_up
+
     async def get_terabox_info(self, url: str):
-        """Get video information from Terabox API"""
+        """Get video information from Terabox API (recent results are served from cache)"""
+        cache_key = normalize_link(url)
+        cached = self._info_cache.get(cache_key)
+        if cached and time.time() - cached[0] < INFO_CACHE_TTL:
+            self._info_cache.move_to_end(cache_key)
+            return cached[1]
+        
+        data = await self._fetch_terabox_info(url)
+        if data and data.get('success'):
+            self._info_cache[cache_key] = (time.time(), data)
+            self._info_cache.move_to_end(cache_key)
+            if len(self._info_cache) > INFO_CACHE_SIZE:
+                self._info_cache.popitem(last=False)
+        return data
+
+    def cached_file_id(self, link_key: str):
+        """Telegram file_id of a link delivered before, if still remembered"""
+        file_id = self._file_id_cache.get(link_key)
+        if file_id is not None:
+            self._file_id_cache.move_to_end(link_key)
+        return file_id
+
+    def remember_file_id(self, link_key: str, file_id):
+        """Remember (or with None, forget) the Telegram file_id a link was delivered as"""
+        if file_id is None:
+            self._file_id_cache.pop(link_key, None)
+            return
+        self._file_id_cache[link_key] = file_id
+        self._file_id_cache.move_to_end(link_key)
+        if len(self._file_id_cache) > FILE_ID_CACHE_SIZE:
+            self._file_id_cache.popitem(last=False)
+
+    async def _fetch_terabox_info(self, url: str):
         try:
             await self.start_session()
-            api_url = f"{TERABOX_API}?url={quote(url)}"
-            
-            async with self.session.get(api_url, timeout=30) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    logger.error(f"API request failed: {response.status}")
+            for attempt in range(API_RETRIES):
+                try:
+                    async with self.session.get(TERABOX_API, params={'url': url}, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                        if response.status == 200:
+                            data = orjson.loads(await response.read())
+                            return data
+                        # Only overload and server errors are worth another try
+                        if response.status != 429 and response.status < 500:
+                            logger.error("API request failed: %s", response.status)
+                            return None
+                        error = f"status {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+                
+                if attempt == API_RETRIES - 1:
+                    logger.error("API request failed after %s attempts: %s", API_RETRIES, error)
                     return None
+                logger.warning("API request failed (attempt %s/%s): %s", attempt + 1, API_RETRIES, error)
+                await asyncio.sleep(2 ** attempt)
         except Exception as e:
-            logger.error(f"Error getting Terabox info: {e}")
+            logger.error("Error getting Terabox info: %s", e)
             return None
 
-    async def download_to_mongodb(self, download_url: str, filename: str, progress_callback=None):
-        """Download file directly to MongoDB GridFS"""
-        try:
-            await self.start_session()
+    async def stream_download(self, download_url: str, progress_callback=None):
+        """Yield the file at download_url chunk by chunk, reporting progress"""
+        await self.start_session()
+        
+        async with self.session.get(download_url) as response:
+            if response.status != 200:
+                raise Exception(f"Download failed with status: {response.status}")
             
-            async with self.session.get(download_url, timeout=None) as response:
-                if response.status != 200:
-                    logger.error(f"Download failed with status: {response.status}")
-                    return None
+            total_size = int(response.headers.get('content-length', 0))
+            if total_size > MAX_FILE_SIZE:
+                raise Exception(f"File is {format_size(total_size)}, over the upload limit")
+            downloaded = 0
+            
+            async for chunk in response.content.iter_any():
+                yield chunk
+                downloaded += len(chunk)
                 
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded = 0
+                # Update activity
+                self.last_activity = time.time()
                 
-                # Create a BytesIO buffer to collect data
-                file_buffer = io.BytesIO()
+                if progress_callback and total_size > 0:
+                    progress = (downloaded / total_size) * 100
+                    await progress_callback(progress, downloaded, total_size)
+
+    async def probe_download(self, download_url: str):
+        """Return (size, supports_ranges) for download_url from a HEAD request"""
+        await self.start_session()
+        try:
+            async with self.session.head(download_url, allow_redirects=True) as response:
+                if response.status != 200:
+                    return 0, False
+                total_size = int(response.headers.get('content-length', 0))
+                return total_size, response.headers.get('accept-ranges', '').lower() == 'bytes'
+        except Exception as e:
+            logger.warning("HEAD probe failed, using a single stream: %s", e)
+            return 0, False
+
+    async def download_ranged(self, download_url: str, filename: str, total_size: int, progress_callback=None):
+        """Download file over RANGE_PARTS parallel Range requests into a bytearray (small files) or a temp file"""
+        loop = asyncio.get_running_loop()
+        downloaded = 0
+        temp_file = None
+        view = None
+        writes = set()  # Executor pwrites still running, which must land before the fd is closed
+        
+        async def write_at(data, offset):
+            future = loop.run_in_executor(None, pwrite_all, temp_file.fileno(), data, offset)
+            writes.add(future)
+            future.add_done_callback(writes.discard)
+            # Shielded so a cancelled part leaves the future tracked until the thread really finishes
+            await asyncio.shield(future)
+        
+        async def fetch_part(start, end):
+            nonlocal downloaded
+            async with self.session.get(download_url, headers={'Range': f'bytes={start}-{end}'}) as response:
+                if response.status != 206:
+                    raise Exception(f"Range request failed with status: {response.status}")
+                # Parts share one buffer, so only the exact range asked for may be written into it
+                content_range = response.headers.get('Content-Range', '')
+                if content_range.partition(' ')[2].partition('/')[0] != f'{start}-{end}':
+                    raise Exception(f"Unexpected Content-Range: {content_range!r}")
                 
-                async for chunk in response.content.iter_chunked(8192):
-                    file_buffer.write(chunk)
-                    downloaded += len(chunk)
+                # Each part owns its byte range, so writes never overlap. In RAM chunks are copied
+                # straight into place; on disk small reads are coalesced in one fixed staging buffer,
+                # so the loop allocates nothing and each executor round-trip writes a sizeable block
+                offset = start
+                staging = memoryview(bytearray(WRITE_BUFFER_SIZE)) if view is None else None
+                filled = 0
+                async for chunk in response.content.iter_any():
+                    size = len(chunk)
+                    if offset + filled + size > end + 1:
+                        raise Exception("Range response overran its Content-Range")
+                    if staging is None:
+                        view[offset:offset + size] = chunk
+                        offset += size
+                    else:
+                        if filled + size > WRITE_BUFFER_SIZE:
+                            await write_at(staging[:filled], offset)
+                            offset += filled
+                            filled = 0
+                        if size >= WRITE_BUFFER_SIZE:
+                            await write_at(chunk, offset)
+                            offset += size
+                        else:
+                            staging[filled:filled + size] = chunk
+                            filled += size
+                    downloaded += size
                     
                     # Update activity
                     self.last_activity = time.time()
                     
-                    if progress_callback and total_size > 0:
-                        progress = (downloaded / total_size) * 100
-                        await progress_callback(progress, downloaded, total_size)
-                
-                # Reset buffer position
-                file_buffer.seek(0)
-                
-                # Store in GridFS
-                file_id = fs.put(
-                    file_buffer.getvalue(),
-                    filename=filename,
-                    content_type='application/octet-stream',
-                    upload_date=datetime.utcnow(),
-                    metadata={'downloaded_at': time.time()}
-                )
-                
-                file_buffer.close()
-                logger.info(f"File {filename} stored in GridFS with ID: {file_id}")
-                return file_id
+                    if progress_callback:
+                        await progress_callback((downloaded / total_size) * 100, downloaded, total_size)
                 
+                if offset + filled != end + 1:
+                    raise Exception("Range response ended before its Content-Range")
+                if filled:
+                    await write_at(staging[:filled], offset)
+        
+        try:
+            # Files that fit comfortably in memory skip the disk round-trip entirely
+            if total_size <= MEMORY_RANGED_MAX:
+                # One allocation, written in place; aiohttp uploads the bytearray as-is without a copy
+                temp_file = bytearray(total_size)
+                view = memoryview(temp_file)
+            else:
+                temp_file = await loop.run_in_executor(None, open_preallocated, total_size)
+            
+            part_size = -(-total_size // RANGE_PARTS)  # Ceiling division
+            async with asyncio.TaskGroup() as tg:
+                for start in range(0, total_size, part_size):
+                    tg.create_task(fetch_part(start, min(start + part_size, total_size) - 1))
+            
+            if view is not None:
+                view.release()
+            else:
+                if hasattr(os, 'posix_fadvise'):
+                    # The upload reads the file front to back once; let read-ahead run ahead of it
+                    os.posix_fadvise(temp_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                temp_file.seek(0)
+            
+            logger.info("File %s downloaded in %s ranged parts", filename, RANGE_PARTS)
+            return temp_file
+            
+        except BaseException as e:
+            # Cancellation (shutdown, a dropped handler) must free the buffer or temp file just like a failure
+            if view is not None:
+                view.release()
+            elif temp_file is not None:
+                if writes:
+                    await asyncio.wait(writes)
+                await loop.run_in_executor(None, temp_file.close)
+            if not isinstance(e, Exception):
+                raise
+            logger.error("Ranged download error: %r", e)
+            return None
+
+    async def send_document_stream(self, chat_id: int, body, filename: str, caption: str):
+        """Upload body (bytes, file or async iterable) via the Bot API, streaming the multipart request"""
+        await self.start_session()
+        
+        form = aiohttp.FormData()
+        form.add_field('chat_id', str(chat_id))
+        form.add_field('caption', caption)
+        form.add_field('parse_mode', 'Markdown')
+        form.add_field('document', body, filename=filename, content_type='application/octet-stream')
+        
+        # No read timeout: Telegram only answers once the whole body is in
+        async with self.session.post(
+            f"{TELEGRAM_API}/bot{BOT_TOKEN}/sendDocument",
+            data=form,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=15)
+        ) as response:
+            raw = await response.read()
+        
+        try:
+            result = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # A proxy in front of the Bot API can answer with an HTML error page
+            result = {'ok': False, 'description': f"HTTP {response.status}"}
+        
+        if not result.get('ok'):
+            raise Exception(f"sendDocument failed: {result.get('description')}")
+        return result['result']
+
+    async def forward_download(self, download_url: str, chat_id: int, filename: str, caption: str, progress_callback=None):
+        """Download and upload concurrently, passing chunks through a bounded queue
+        
+        Returns the sent message, or None if the download failed; an upload failure is raised.
+        """
+        queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        download_error = None
+        
+        async def produce():
+            nonlocal download_error
+            try:
+                buffer = bytearray()
+                async for chunk in self.stream_download(download_url, progress_callback):
+                    buffer += chunk
+                    # Feed an idle uploader early; let blocks grow while it is still busy sending
+                    if len(buffer) >= PIPELINE_CHUNK_MAX or (len(buffer) >= PIPELINE_CHUNK_MIN and queue.empty()):
+                        await queue.put(buffer)
+                        buffer = bytearray()
+                if buffer:
+                    await queue.put(buffer)
+                await queue.put(None)
+            except Exception as e:
+                download_error = e
+                await queue.put(e)
+        
+        async def consume():
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        
+        producer = asyncio.create_task(produce())
+        try:
+            message = await self.send_document_stream(chat_id, consume(), filename, caption)
+            logger.info("File %s streamed straight to Telegram", filename)
+            return message
+        
         except Exception as e:
-            logger.error(f"Download error: {e}")
+            if download_error is None:
+                # The bytes were flowing fine, so Telegram rejected the upload; let the caller report that
+                raise
+            logger.error("Streamed download error: %s", e)
             return None
+        
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
 
-    def get_file_from_mongodb(self, file_id):
+    async def download_to_mongodb(self, download_url: str, filename: str, progress_callback=None):
+        """Download file directly to MongoDB GridFS"""
+        try:
+            chunks = self.stream_download(download_url, progress_callback)
+            
+            # Sniff the start of the file to decide whether compressing it is worthwhile
+            head = bytearray()
+            async for chunk in chunks:
+                head += chunk
+                if len(head) >= SNIFF_SIZE:
+                    break
+            
+            metadata = {'downloaded_at': time.time(), 'content_type': 'application/octet-stream'}
+            compressor = None
+            if not is_compressed_format(head):
+                compressor = zstandard.ZstdCompressor(level=3).compressobj()
+                metadata['codec'] = 'zstd'
+            
+            # Write chunks straight into GridFS so memory stays bounded
+            grid_in = fs.open_upload_stream(filename, metadata=metadata)
+            loop = asyncio.get_running_loop()
+            pending = bytearray()
+            
+            async def write(data):
+                nonlocal pending
+                if not compressor:
+                    await grid_in.write(data)
+                    return
+                # zstd releases the GIL, so compress off the event loop, in blocks big enough to amortise the hop
+                pending += data
+                if len(pending) >= WRITE_BUFFER_SIZE:
+                    block, pending = pending, bytearray()
+                    await grid_in.write(await loop.run_in_executor(None, compressor.compress, block))
+            
+            try:
+                await write(bytes(head))
+                async for chunk in chunks:
+                    await write(chunk)
+                if compressor:
+                    await grid_in.write(await loop.run_in_executor(
+                        None, lambda: compressor.compress(pending) + compressor.flush()
+                    ))
+            except Exception:
+                await grid_in.abort()
+                raise
+            
+            await grid_in.close()
+            file_id = grid_in._id
+            logger.info("File %s stored in GridFS with ID: %s", filename, file_id)
+            return file_id
+            
+        except Exception as e:
+            logger.error("Download error: %s", e)
+            return None
+
+    async def get_file_from_mongodb(self, file_id):
         """Retrieve file from MongoDB GridFS"""
         try:
-            return fs.get(file_id)
+            return await fs.open_download_stream(file_id)
         except Exception as e:
-            logger.error(f"Error retrieving file: {e}")
+            logger.error("Error retrieving file: %s", e)
             return None
 
-    def delete_file_from_mongodb(self, file_id):
+    async def read_gridfs(self, grid_file):
+        """Yield a GridFS file's original bytes chunk by chunk, undoing its codec"""
+        decompressor = None
+        if (grid_file.metadata or {}).get('codec') == 'zstd':
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+        
+        loop = asyncio.get_running_loop()
+        while chunk := await grid_file.readchunk():
+            # Like compression, decompressing a multi-MiB chunk is kept off the event loop
+            data = await loop.run_in_executor(None, decompressor.decompress, chunk) if decompressor else chunk
+            if data:
+                yield data
+
+    async def delete_file_from_mongodb(self, file_id):
         """Delete file from MongoDB GridFS"""
         try:
-            fs.delete(file_id)
-            logger.info(f"File {file_id} deleted from GridFS")
+            await fs.delete(file_id)
+            logger.info("File %s deleted from GridFS", file_id)
             return True
         except Exception as e:
-            logger.error(f"Error deleting file: {e}")
+            logger.error("Error deleting file: %s", e)
             return False
 
+    def schedule_cleanup(self, file_id, download_id):
+        """Queue an uploaded file for deletion from GridFS without holding up the caller"""
+        self._cleanup_queue.put_nowait((file_id, download_id))
+
+    async def cleanup_worker(self):
+        """Delete queued GridFS files in batches, off the request path"""
+        while True:
+            batch = [await self._cleanup_queue.get()]
+            # Let a burst of finished uploads join the same batch
+            await asyncio.sleep(CLEANUP_DELAY)
+            while len(batch) < CLEANUP_BATCH_SIZE and not self._cleanup_queue.empty():
+                batch.append(self._cleanup_queue.get_nowait())
+            
+            try:
+                await self.delete_files_from_mongodb([file_id for file_id, _ in batch])
+                await downloads_collection.update_many(
+                    {"_id": {"$in": [ObjectId(download_id) for _, download_id in batch]}},
+                    {"$set": {"gridfs_file_id": None}}
+                )
+            except Exception as e:
+                # Anything missed here is reaped by keep_alive once it passes DOWNLOAD_RETENTION
+                logger.error("Cleanup error: %s", e)
+
+    async def delete_files_from_mongodb(self, file_ids):
+        """Delete several files from MongoDB GridFS in one round trip per collection"""
+        await db.fs.files.delete_many({"_id": {"$in": file_ids}})
+        await db.fs.chunks.delete_many({"files_id": {"$in": file_ids}})
+        logger.info("Deleted %s files from GridFS", len(file_ids))
+
 bot_instance = TeraboxBot()
 
+# Leading bytes of formats that are already compressed (video, audio, images, archives)
+COMPRESSED_SIGNATURES = (
+    b'\x1aE\xdf\xa3',      # Matroska / WebM
+    b'RIFF',                # AVI / WAV
+    b'FLV',                 # Flash video
+    b'OggS',                # Ogg
+    b'ID3', b'\xff\xfb',    # MP3
+    b'\x89PNG', b'\xff\xd8\xff', b'GIF8',
+    b'PK\x03\x04', b'Rar!', b'7z\xbc\xaf', b'\x1f\x8b', b'(\xb5/\xfd',
+)
+
+def terabox_link_host(link):
+    """Lowercased host of an http(s) Terabox link, or None if link isn't one"""
+    # urlsplit resolves userinfo, so https://terabox.com:x@evil.example/ yields evil.example
+    try:
+        parts = urlsplit(link)
+        host = parts.hostname
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https') or not host or not is_terabox_host(host):
+        return None
+    return host
+
+def is_terabox_host(host):
+    """Return True if host is a supported Terabox domain or a subdomain of one"""
+    # One set lookup per label suffix, however many domains are supported
+    while host:
+        if host in TERABOX_DOMAINS:
+            return True
+        host = host.partition('.')[2]
+    return False
+
+def is_compressed_format(head):
+    """Return True if the sniffed bytes look like an already-compressed format"""
+    # MP4 / MOV / 3GP carry their 'ftyp' box marker at offset 4
+    return head[4:8] == b'ftyp' or bytes(head[:4]).startswith(COMPRESSED_SIGNATURES)
+
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB')
+
+def format_size(size_bytes):
+    """Format a byte count with the largest fitting binary unit, e.g. '1.50 GB'"""
+    size_bytes = int(size_bytes or 0)
+    # Each unit is 2**10 of the previous one, so the bit length picks the unit directly
+    i = min(max(size_bytes.bit_length() - 1, 0) // 10, len(SIZE_UNITS) - 1)
+    value = round(size_bytes / (1 << (10 * i)), 2)
+    # Just below a boundary the value rounds up to 1024.00; show it in the next unit instead
+    if value >= 1024 and i < len(SIZE_UNITS) - 1:
+        i += 1
+        value = size_bytes / (1 << (10 * i))
+    return f"{value:.2f} {SIZE_UNITS[i]}"
+
+SIZE_MULTIPLIERS = {'B': 1, 'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30, 'TB': 1 << 40}
+SIZE_RE = re.compile(r'\s*(\d+(?:\.\d+)?)\s*(?:([KMGT])I?)?(B?)\s*', re.I)
+
+def parse_size(value):
+    """Byte count from the API's size field (a number or a string like '12.5 MB' / '1.2gb'), None if unknown"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    match = SIZE_RE.fullmatch(str(value)) if value is not None else None
+    if not match:
+        return None
+    number, prefix, byte = match.groups()
+    if prefix and not byte:
+        return None  # '12 M' is ambiguous, don't guess
+    return int(float(number) * SIZE_MULTIPLIERS[(prefix or '').upper() + 'B'])
+
+def normalize_link(url):
+    """Canonical cache key for a share link: lowercase host, no fragment or tracking params"""
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith('utm_')])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), query, ''))
+
+def pwrite_all(fd, data, offset):
+    """Write all of data to fd at offset (run in an executor)"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+def open_preallocated(size):
+    """Open an anonymous temp file with size bytes reserved (run in an executor)"""
+    temp_file = tempfile.TemporaryFile(dir=DOWNLOAD_DIR)
+    try:
+        # Reserve the whole file up front: contiguous extents, and a full disk fails before any bytes move.
+        # This can block for a while, since glibc zero-fills where the filesystem lacks fallocate
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(temp_file.fileno(), 0, size)
+        else:
+            os.ftruncate(temp_file.fileno(), size)
+    except Exception:
+        temp_file.close()
+        raise
+    return temp_file
+
+def put_latest(queue, item):
+    """Put item on a size-1 queue, replacing whatever is still waiting there"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+# Only 11 distinct bars exist, so build them once instead of on every progress update
+_BARS = tuple('█' * i + '▒' * (10 - i) for i in range(11))
+
+def create_progress_bar(percentage):
+    """Render a 10-block progress bar followed by the percentage"""
+    # Clamp, since a body that overruns its Content-Length would otherwise index past the table
+    return f"{_BARS[min(max(int(percentage // 10), 0), 10)]} {percentage:.1f}%"
+
+def file_caption(file_name):
+    """Caption attached to every delivered file"""
+    return f"📁 **{file_name}**\n\n🔥 **Downloaded from Terabox**\n💾 **Processed via {STORAGE_LABEL}**\n🚀 **Powered by Koyeb 24/7**\n\n**Credits:** NY BOTZ"
+
+def sent_file_id(message):
+    """file_id from a Bot API message dict; sendDocument may file media as video or animation"""
+    for kind in ('document', 'video', 'animation', 'audio'):
+        if kind in message:
+            return message[kind]['file_id']
+    return None
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler"""
     bot_instance.last_activity = time.time()
@@ -202,7 +803,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.effective_user.username or "Unknown"
     
     # Store user info
-    users_collection.update_one(
+    await users_collection.update_one(
         {"user_id": user_id},
         {"$set": {
             "username": username, 
@@ -245,7 +846,7 @@ Send me a Terabox link and I'll download and upload the video for you!
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Help command handler"""
     bot_instance.last_activity = time.time()
-    help_text = """
+    help_text = f"""
 🆘 **Help - How to use the bot**
 
 **Step by Step:**
@@ -261,12 +862,12 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 - teraboxapp.com
 
 **File Limits:**
-- Maximum file size: 2GB (Telegram limit)
+- Maximum file size: {UPLOAD_LIMIT_LABEL} (Telegram limit)
 - Supported formats: All video/audio formats
 
 **Storage:**
-- Files are temporarily stored in MongoDB
-- Automatic cleanup after upload
+- Files are streamed straight to Telegram
+- Optional MongoDB staging with automatic cleanup
 - 24/7 availability on Koyeb
 
 **Credits:** NY BOTZ
@@ -281,18 +882,10 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     bot_instance.last_activity = time.time()
     user_id = update.effective_user.id
     
-    user_downloads = downloads_collection.count_documents({"user_id": user_id, "status": "completed"})
-    total_downloads = downloads_collection.count_documents({"status": "completed"})
-    pending_downloads = downloads_collection.count_documents({"status": {"$in": ["pending", "downloading"]}})
-    
-    # Get GridFS stats
-    try:
-        gridfs_files = db.fs.files.count_documents({})
-        gridfs_size = sum([doc.get('length', 0) for doc in db.fs.files.find({}, {'length': 1})])
-        gridfs_size_mb = gridfs_size / (1024 * 1024)
-    except:
-        gridfs_files = 0
-        gridfs_size_mb = 0
+    # Per-user count is a single document read; bot-wide numbers come from a short-lived cache
+    user_doc = await users_collection.find_one({"user_id": user_id}, {"completed_downloads": 1})
+    user_downloads = (user_doc or {}).get('completed_downloads', 0)
+    total_downloads, pending_downloads, gridfs_files, gridfs_size_mb = await bot_instance.get_bot_stats()
     
     stats_text = f"""
 📊 **Statistics Dashboard**
@@ -317,12 +910,7 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Status command handler"""
     bot_instance.last_activity = time.time()
     
-    try:
-        # Test MongoDB connection
-        client.admin.command('ping')
-        mongodb_status = "✅ Connected"
-    except:
-        mongodb_status = "❌ Disconnected"
+    mongodb_status = "✅ Connected" if await bot_instance.mongodb_is_up() else "❌ Disconnected"
     
     uptime = time.time() - bot_instance.start_time
     uptime_hours = uptime / 3600
@@ -353,9 +941,12 @@ async def handle_terabox_link(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = update.effective_user.id
     message_text = update.message.text
     
-    # Check if it's a Terabox link
-    terabox_domains = ['terabox.com', '1024terabox.com', 'teraboxapp.com']
-    if not any(domain in message_text.lower() for domain in terabox_domains):
+    # Only the first word is treated as the link, so long pasted messages cost nothing extra
+    parts = message_text.split(maxsplit=1)
+    link = parts[0] if parts else ''
+    
+    # Check if it's a Terabox link (match the host itself, not any substring of the message)
+    if terabox_link_host(link) is None:
         await update.message.reply_text(
             "❌ Please send a valid Terabox link!\n\n**Credits:** NY BOTZ"
         )
@@ -368,7 +959,7 @@ async def handle_terabox_link(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
     
     # Get file information
-    file_info = await bot_instance.get_terabox_info(message_text)
+    file_info = await bot_instance.get_terabox_info(link)
     
     if not file_info or not file_info.get('success'):
         await processing_msg.edit_text(
@@ -383,21 +974,20 @@ async def handle_terabox_link(update: Update, context: ContextTypes.DEFAULT_TYPE
     try:
         file_data = file_info.get('data', {})
         file_name = file_data.get('filename', 'Unknown')
-        file_size = file_data.get('size', 0)
+        file_size = parse_size(file_data.get('size'))
         download_url = file_data.get('downloadUrl', '')
         thumbnail = file_data.get('thumbnail', '')
         
-        # Convert size to readable format
-        size_mb = file_size / (1024 * 1024) if file_size else 0
-        size_text = f"{size_mb:.2f} MB" if size_mb < 1024 else f"{size_mb/1024:.2f} GB"
+        # Convert size to readable format; an unparseable size is left to the HEAD probe before downloading
+        size_text = format_size(file_size) if file_size is not None else "Unknown"
         
-        # Check Telegram file size limit (2GB)
-        if file_size > 2 * 1024 * 1024 * 1024:
+        # Check Telegram's upload limit before committing to the transfer
+        if file_size is not None and file_size > MAX_FILE_SIZE:
             await processing_msg.edit_text(
                 f"❌ **File too large for Telegram!**\n\n"
                 f"📁 **File:** {file_name}\n"
                 f"📊 **Size:** {size_text}\n"
-                f"🚫 **Limit:** 2GB\n\n"
+                f"🚫 **Limit:** {UPLOAD_LIMIT_LABEL}\n\n"
                 "**Credits:** NY BOTZ",
                 parse_mode='Markdown'
             )
@@ -410,13 +1000,13 @@ async def handle_terabox_link(update: Update, context: ContextTypes.DEFAULT_TYPE
             "file_size": file_size,
             "download_url": download_url,
             "thumbnail": thumbnail,
-            "original_link": message_text,
+            "original_link": link,
             "timestamp": time.time(),
             "status": "pending",
             "gridfs_file_id": None
         }
         
-        result = downloads_collection.insert_one(download_doc)
+        result = await downloads_collection.insert_one(download_doc)
         download_id = str(result.inserted_id)
         
         # Create download button
@@ -430,7 +1020,7 @@ async def handle_terabox_link(update: Update, context: ContextTypes.DEFAULT_TYPE
 📄 **Name:** {file_name}
 📊 **Size:** {size_text}
 🔗 **Source:** Terabox
-💾 **Storage:** MongoDB GridFS
+💾 **Storage:** {STORAGE_LABEL}
 🚀 **Server:** Koyeb 24/7
 
 **Credits:** NY BOTZ
@@ -439,12 +1029,59 @@ async def handle_terabox_link(update: Update, context: ContextTypes.DEFAULT_TYPE
         await processing_msg.edit_text(info_text, parse_mode='Markdown', reply_markup=keyboard)
         
     except Exception as e:
-        logger.error(f"Error processing file info: {e}")
+        logger.error("Error processing file info: %s", e)
         await processing_msg.edit_text(
             "❌ **Error processing file information!**\n\n**Credits:** NY BOTZ",
             parse_mode='Markdown'
         )
 
+async def mark_completed(query, download_id, download_doc):
+    """Record a delivered download and tell the user"""
+    # Update status to completed
+    await downloads_collection.update_one(
+        {"_id": ObjectId(download_id)},
+        {
+            "$set": {
+                "status": "completed", 
+                "completed_at": datetime.utcnow(),  # BSON date, as the TTL index requires
+                "uploaded_to_telegram": True
+            }
+        }
+    )
+    
+    # Keep a lasting per-user tally, since the download doc itself expires
+    await users_collection.update_one(
+        {"user_id": query.from_user.id},
+        {"$inc": {"completed_downloads": 1}},
+        upsert=True
+    )
+    
+    await query.edit_message_text(
+        "✅ **Download completed successfully!**\n\n"
+        f"📁 **File:** {download_doc['file_name']}\n"
+        f"💾 **Storage:** {STORAGE_LABEL}\n"
+        f"📤 **Uploaded:** Telegram\n"
+        f"🚀 **Server:** Koyeb 24/7\n\n"
+        "**Credits:** NY BOTZ",
+        parse_mode='Markdown'
+    )
+
+async def send_known_file(query, context, download_id, download_doc, telegram_file_id):
+    """Resend a file Telegram already stores; returns False if Telegram rejects the file_id"""
+    try:
+        await context.bot.send_document(
+            chat_id=query.from_user.id,
+            document=telegram_file_id,
+            caption=file_caption(download_doc['file_name']),
+            parse_mode='Markdown'
+        )
+    except Exception as e:
+        logger.warning("Resending by file_id failed: %s", e)
+        return False
+    
+    await mark_completed(query, download_id, download_doc)
+    return True
+
 async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle download button callback"""
     bot_instance.last_activity = time.time()
@@ -456,7 +1093,7 @@ async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT
     
     # Get download info from MongoDB
     try:
-        download_doc = downloads_collection.find_one({"_id": ObjectId(download_id)})
+        download_doc = await downloads_collection.find_one({"_id": ObjectId(download_id)})
     except:
         await query.edit_message_text(
             "❌ **Invalid download session!**\n\n**Credits:** NY BOTZ",
@@ -479,161 +1116,277 @@ async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT
         )
         return
     
+    # Telegram keeps every file it was sent, so a link delivered before is resent without any transfer
+    link_key = normalize_link(download_doc['original_link'])
+    telegram_file_id = bot_instance.cached_file_id(link_key)
+    if telegram_file_id:
+        if await send_known_file(query, context, download_id, download_doc, telegram_file_id):
+            return
+        bot_instance.remember_file_id(link_key, None)
+    
+    # Someone is already fetching this link: wait for that transfer and resend Telegram's copy
+    waiting = False
+    while (pending := bot_instance.inflight.get(link_key)) is not None:
+        # Telegram rejects an edit that doesn't change the text, so announce the wait only once
+        if not waiting:
+            waiting = True
+            await query.edit_message_text(
+                "⏳ **This file is already being downloaded, waiting for it...**\n\n**Credits:** NY BOTZ",
+                parse_mode='Markdown'
+            )
+        telegram_file_id = await asyncio.shield(pending)
+        if telegram_file_id and await send_known_file(query, context, download_id, download_doc, telegram_file_id):
+            return
+    
+    future = asyncio.get_running_loop().create_future()
+    bot_instance.inflight[link_key] = future
+    telegram_file_id = None
+    try:
+        # A few downloads at full speed beat many thrashing each other for bandwidth and disk
+        if bot_instance.download_slots.locked():
+            await query.edit_message_text(
+                "⏳ **Queued** - all download slots are busy, yours starts shortly...\n\n**Credits:** NY BOTZ",
+                parse_mode='Markdown'
+            )
+        async with bot_instance.download_slots:
+            telegram_file_id = await download_and_send(query, context, download_id, download_doc)
+        if telegram_file_id:
+            bot_instance.remember_file_id(link_key, telegram_file_id)
+    finally:
+        # Hand the result to everyone who tapped the same link meanwhile
+        del bot_instance.inflight[link_key]
+        future.set_result(telegram_file_id)
+
+async def download_and_send(query, context, download_id, download_doc):
+    """Download a file and upload it to the user; returns Telegram's file_id, or None on failure"""
     # Update status to downloading
-    downloads_collection.update_one(
+    await downloads_collection.update_one(
         {"_id": ObjectId(download_id)},
         {"$set": {"status": "downloading", "download_started": time.time()}}
     )
     
     # Start download process
     await query.edit_message_text(
-        "⬇️ **Starting download to MongoDB...**\n\n**Credits:** NY BOTZ",
+        "⬇️ **Starting download...**\n\n**Credits:** NY BOTZ",
         parse_mode='Markdown'
     )
     
+    # Progress edits are handed to a separate task so the download never waits on Telegram
+    progress_queue = asyncio.Queue(maxsize=1)
+    progress_task = asyncio.create_task(bot_instance.progress_editor(query, progress_queue))
+    
     # Progress callback
     last_update = 0
+    last_pct = -1
+    total_text = None  # The total never changes mid-download, so format it once
     async def progress_callback(progress, downloaded, total):
-        nonlocal last_update
+        nonlocal last_update, last_pct, total_text
         current_time = time.time()
         
         # Update activity
         bot_instance.last_activity = current_time
         
-        # Update every 5 seconds
-        if current_time - last_update >= 5:
+        # Update every 5 seconds, and only when the shown percentage changed
+        if current_time - last_update >= 5 and int(progress) != last_pct:
+            # Advance the gate before editing so a failed edit isn't retried on every chunk
+            last_update = current_time
+            last_pct = int(progress)
+            if total_text is None:
+                total_text = format_size(total)
             progress_text = f"""
-⬇️ **Downloading to MongoDB...**
+⬇️ **Downloading...**
 
 📁 **File:** {download_doc['file_name']}
-📊 **Progress:** {progress:.1f}%
-📥 **Downloaded:** {downloaded/(1024*1024):.1f} MB / {total/(1024*1024):.1f} MB
-💾 **Storage:** GridFS
+📊 **Progress:** {create_progress_bar(progress)}
+📥 **Downloaded:** {format_size(downloaded)} / {total_text}
+💾 **Storage:** {STORAGE_LABEL}
 🚀 **Server:** Koyeb 24/7
 
 **Credits:** NY BOTZ
             """
             
-            try:
-                await query.edit_message_text(progress_text, parse_mode='Markdown')
-                last_update = current_time
-            except:
-                pass  # Ignore rate limit errors
-    
-    # Download file to MongoDB GridFS
-    file_id = await bot_instance.download_to_mongodb(
-        download_doc['download_url'], 
-        download_doc['file_name'],
-        progress_callback
-    )
+            put_latest(progress_queue, progress_text)
+    
+    caption = file_caption(download_doc['file_name'])
+    
+    # Download the file, staging it in GridFS only when USE_GRIDFS is enabled
+    file_id = None
+    temp_file = None
+    sent = None  # Set when the file was streamed straight through to Telegram
+    upload_error = None  # Set when Telegram rejected a streamed upload
+    too_large = False
+    try:
+        # The API's size can be stale or missing, so check the real length before moving any bytes
+        total_size, supports_ranges = await bot_instance.probe_download(download_doc['download_url'])
+        if total_size > MAX_FILE_SIZE:
+            too_large = True
+        elif USE_GRIDFS:
+            file_id = await bot_instance.download_to_mongodb(
+                download_doc['download_url'], 
+                download_doc['file_name'],
+                progress_callback
+            )
+        else:
+            # Large files from servers that support it are fetched over parallel connections first
+            if supports_ranges and total_size >= RANGED_MIN_SIZE:
+                temp_file = await bot_instance.download_ranged(
+                    download_doc['download_url'],
+                    download_doc['file_name'],
+                    total_size,
+                    progress_callback
+                )
+            # Servers that advertise ranges but answer 200 (or drop a part) get a plain single stream
+            if temp_file is None:
+                try:
+                    sent = await bot_instance.forward_download(
+                        download_doc['download_url'],
+                        query.from_user.id,
+                        download_doc['file_name'],
+                        caption,
+                        progress_callback
+                    )
+                except Exception as e:
+                    upload_error = e
+    finally:
+        # Stop the editor before the next status edit so a stale progress text can't land after it
+        progress_task.cancel()
+        await asyncio.gather(progress_task, return_exceptions=True)
     
-    if not file_id:
-        downloads_collection.update_one(
+    if too_large:
+        await downloads_collection.update_one(
             {"_id": ObjectId(download_id)},
-            {"$set": {"status": "failed", "error": "Download failed"}}
+            {"$set": {"status": "failed", "error": "File too large"}}
         )
         
         await query.edit_message_text(
-            "❌ **Download failed!**\n\n"
-            "Please try again later.\n\n"
+            "❌ **File too large for Telegram!**\n\n"
+            f"📁 **File:** {download_doc['file_name']}\n"
+            f"📊 **Size:** {format_size(total_size)}\n"
+            f"🚫 **Limit:** {UPLOAD_LIMIT_LABEL}\n\n"
             "**Credits:** NY BOTZ",
             parse_mode='Markdown'
         )
-        return
-    
-    # Update document with GridFS file ID
-    downloads_collection.update_one(
-        {"_id": ObjectId(download_id)},
-        {"$set": {"gridfs_file_id": file_id, "status": "uploading"}}
-    )
+        return None
     
-    # Upload to Telegram
-    await query.edit_message_text(
-        "⬆️ **Uploading to Telegram...**\n\n**Credits:** NY BOTZ",
-        parse_mode='Markdown'
-    )
-    
-    try:
-        # Get file from GridFS
-        grid_file = bot_instance.get_file_from_mongodb(file_id)
-        
-        if not grid_file:
-            raise Exception("Failed to retrieve file from MongoDB")
-        
-        # Create file-like object from GridFS
-        file_data = io.BytesIO(grid_file.read())
-        file_data.name = download_doc['file_name']
+    if file_id is None and temp_file is None and sent is None and upload_error is None:
+        await downloads_collection.update_one(
+            {"_id": ObjectId(download_id)},
+            {"$set": {"status": "failed", "error": "Download failed"}}
+        )
         
-        # Send document to Telegram
-        await context.bot.send_document(
-            chat_id=query.from_user.id,
-            document=file_data,
-            filename=download_doc['file_name'],
-            caption=f"📁 **{download_doc['file_name']}**\n\n🔥 **Downloaded from Terabox**\n💾 **Processed via MongoDB**\n🚀 **Powered by Koyeb 24/7**\n\n**Credits:** NY BOTZ",
+        await query.edit_message_text(
+            "❌ **Download failed!**\n\n"
+            "Please try again later.\n\n"
+            "**Credits:** NY BOTZ",
             parse_mode='Markdown'
         )
-        
-        # Update status to completed
-        downloads_collection.update_one(
+        return None
+    
+    if sent is None and upload_error is None:
+        # Update document with GridFS file ID
+        await downloads_collection.update_one(
             {"_id": ObjectId(download_id)},
-            {
-                "$set": {
-                    "status": "completed", 
-                    "completed_at": time.time(),
-                    "uploaded_to_telegram": True
-                }
-            }
+            {"$set": {"gridfs_file_id": file_id, "status": "uploading"}}
         )
         
+        # Upload to Telegram
         await query.edit_message_text(
-            "✅ **Download completed successfully!**\n\n"
-            f"📁 **File:** {download_doc['file_name']}\n"
-            f"💾 **Storage:** MongoDB GridFS\n"
-            f"📤 **Uploaded:** Telegram\n"
-            f"🚀 **Server:** Koyeb 24/7\n\n"
-            "**Credits:** NY BOTZ",
+            "⬆️ **Uploading to Telegram...**\n\n**Credits:** NY BOTZ",
             parse_mode='Markdown'
         )
+    
+    try:
+        if upload_error is not None:
+            raise upload_error
         
-        # Clean up: Delete file from GridFS after successful upload
-        await asyncio.sleep(5)  # Wait 5 seconds before cleanup
-        bot_instance.delete_file_from_mongodb(file_id)
+        # Files streamed straight through were already delivered while downloading
+        if sent is None:
+            if file_id:
+                # Get file from GridFS
+                grid_file = await bot_instance.get_file_from_mongodb(file_id)
+                
+                if not grid_file:
+                    raise Exception("Failed to retrieve file from MongoDB")
+                
+                # Chunks go to Telegram as they are read, so the file is never held whole
+                body = bot_instance.read_gridfs(grid_file)
+            else:
+                body = temp_file
+            
+            # aiohttp streams the body as it goes; PTB would read all of it into memory first
+            sent = await bot_instance.send_document_stream(
+                query.from_user.id,
+                body,
+                download_doc['file_name'],
+                caption
+            )
         
-        downloads_collection.update_one(
-            {"_id": ObjectId(download_id)},
-            {"$set": {"gridfs_file_id": None, "cleanup_completed": True}}
-        )
+        await mark_completed(query, download_id, download_doc)
+        
+        # Clean up: Delete file from GridFS in the background after successful upload
+        if file_id:
+            bot_instance.schedule_cleanup(file_id, download_id)
+        
+        return sent_file_id(sent)
         
     except Exception as e:
-        logger.error(f"Upload error: {e}")
+        logger.error("Upload error: %s", e)
         
         # Clean up failed upload
         if file_id:
-            bot_instance.delete_file_from_mongodb(file_id)
+            await bot_instance.delete_file_from_mongodb(file_id)
         
-        downloads_collection.update_one(
+        await downloads_collection.update_one(
             {"_id": ObjectId(download_id)},
             {"$set": {"status": "upload_failed", "error": str(e)}}
         )
         
         await query.edit_message_text(
             "❌ **Upload to Telegram failed!**\n\n"
-            "File was downloaded but couldn't be uploaded.\n\n"
+            f"**Reason:** {escape_markdown(str(e))}\n\n"
             "**Credits:** NY BOTZ",
             parse_mode='Markdown'
         )
+        return None
+    
+    finally:
+        # In-memory downloads are a plain bytearray; only real temp files need closing
+        if temp_file is not None and not isinstance(temp_file, bytearray):
+            # Freeing a large file's extents can take a moment; keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, temp_file.close)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Global error handler"""
-    logger.error(f"Update {update} caused error {context.error}")
+    logger.error("Update %s caused error %s", update, context.error)
     bot_instance.last_activity = time.time()
 
+async def health_check(request):
+    """Liveness endpoint for the container health check and Koyeb"""
+    body = {"status": "ok", "uptime": int(time.time() - bot_instance.start_time)}
+    return web.Response(body=orjson.dumps(body), content_type='application/json')
+
+async def start_health_server():
+    """Serve / and /health on PORT from the bot's own event loop"""
+    app = web.Application()
+    app.router.add_get('/', health_check)
+    app.router.add_get('/health', health_check)
+    
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', PORT).start()
+    bot_instance.health_runner = runner
+    logger.info("Health check listening on port %s", PORT)
+
 async def shutdown_handler(application):
     """Graceful shutdown handler"""
     logger.info("Shutting down bot...")
+    if bot_instance.health_runner:
+        await bot_instance.health_runner.cleanup()
     await bot_instance.close_session()
     if bot_instance.keep_alive_task:
         bot_instance.keep_alive_task.cancel()
+    if bot_instance.cleanup_task:
+        bot_instance.cleanup_task.cancel()
     client.close()
     logger.info("Bot shutdown complete")
 
@@ -641,8 +1394,17 @@ def main():
     """Main function to run the bot"""
     logger.info("Starting Terabox Download Bot...")
     
+    # libuv's loop makes socket reads, writes and timers cheaper for aiohttp and PTB alike
+    if uvloop is not None:
+        uvloop.install()
+    
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Handle updates concurrently so one user's download doesn't hold up everyone else
+    # The bot's own calls go to the same Bot API server as the uploads; a bot is only logged in on one of them
+    application = (
+        Application.builder().token(BOT_TOKEN).base_url(f"{TELEGRAM_API}/bot")
+        .concurrent_updates(True).build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -657,7 +1419,18 @@ def main():
     
     # Start keep-alive task
     async def post_init(application):
+        await check_mongodb()
+        await ensure_indexes()
+        
+        # Create the temp download directory once rather than per download
+        if DOWNLOAD_DIR:
+            os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        
+        # Open the shared HTTP session up front so every request reuses its pool
+        await bot_instance.start_session()
+        await start_health_server()
         bot_instance.keep_alive_task = asyncio.create_task(bot_instance.keep_alive())
+        bot_instance.cleanup_task = asyncio.create_task(bot_instance.cleanup_worker())
         logger.info("Keep-alive task started")
     
     # Add shutdown handler
@@ -673,8 +1446,8 @@ def main():
     application.run_polling(
         allowed_updates=Update.ALL_TYPES,
         drop_pending_updates=True,
-        poll_interval=1.0,
-        timeout=10
+        poll_interval=0.0,  # getUpdates long-polls, so there is no need to sleep between calls
+        timeout=30
     )
 
 if __name__ == '__main__':
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# main.py exits at import without a token; nothing here talks to Telegram or MongoDB
+os.environ.setdefault('BOT_TOKEN', 'test-token')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from main import TeraboxBot
+
+
+def test_editor_exits_when_cancelled_mid_edit():
+    async def scenario():
+        editing = asyncio.Event()
+
+        async def edit_message_text(text, parse_mode=None):
+            editing.set()
+            await asyncio.sleep(0.3)
+
+        query = SimpleNamespace(message=SimpleNamespace(chat_id=1), edit_message_text=edit_message_text)
+        queue = asyncio.Queue(maxsize=1)
+        queue.put_nowait('progress')
+
+        editor = asyncio.create_task(TeraboxBot().progress_editor(query, queue))
+        await editing.wait()
+        editor.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(editor, timeout=1)
+
+    asyncio.run(scenario())
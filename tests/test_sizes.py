@@ -0,0 +1,34 @@
+import pytest
+
+from main import format_size, parse_size
+
+
+@pytest.mark.parametrize('value, expected', [
+    (123, 123),
+    ('900', 900),
+    ('12.5 MB', 12.5 * (1 << 20)),
+    ('1.2GB', int(1.2 * (1 << 30))),
+    ('1.2gb', int(1.2 * (1 << 30))),
+    ('2 gb', 2 << 30),
+    ('1.5 KiB', 1536),
+])
+def test_parses_numbers_and_unit_strings(value, expected):
+    assert parse_size(value) == int(expected)
+
+
+@pytest.mark.parametrize('value', [None, '', 'abc', '3 XB', '12 M', '900I'])
+def test_unknown_sizes_are_none(value):
+    assert parse_size(value) is None
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0, '0.00 B'),
+    (1023, '1023.00 B'),
+    (1024, '1.00 KB'),
+    (1048570, '1023.99 KB'),
+    (1048575, '1.00 MB'),
+    (1073741823, '1.00 GB'),
+    (1 << 40, '1024.00 GB'),
+])
+def test_format_size_steps_up_at_unit_boundaries(value, expected):
+    assert format_size(value) == expected